@@ -0,0 +1,66 @@
+import time
+from collections import deque
+
+import numpy as np
+
+
+class AdaptivePoller:
+    # Chooses the wait before the next detection from the gaps between past hits.
+    # The gap histogram p(t) gets a per-minute budget of polls placed with density
+    # ~ sqrt(p(t)), which minimises the expected detection latency for that budget;
+    # the next poll is where one more poll's worth of that density has accumulated.
+    def __init__(self, min_interval=3, hit_interval=7, max_interval=15,
+                 polls_per_minute=12, history=32, min_samples=4):
+        self.min_interval = min_interval
+        self.hit_interval = hit_interval
+        self.max_interval = max_interval
+        self.polls_per_minute = polls_per_minute
+        self.min_samples = min_samples
+        self.gaps = deque(maxlen=history)
+        self.last_hit = None
+        self.missed_since_hit = False
+
+    def next_interval(self, got_hit, now=None):
+        now = time.time() if now is None else now
+        if got_hit:
+            # Only a hit after a quiet stretch says when new targets arrive; back-to-back
+            # hits on an object that stays in view are always ~hit_interval apart
+            if self.last_hit is not None and self.missed_since_hit:
+                self.gaps.append(now - self.last_hit)
+            self.last_hit = now
+            self.missed_since_hit = False
+            # Target locked: slow down to avoid re-reporting the same object
+            return self.hit_interval
+        self.missed_since_hit = True
+        if self.last_hit is None or len(self.gaps) < self.min_samples:
+            # Not enough history yet: stay fast while idle
+            return self.min_interval
+
+        elapsed = now - self.last_hit
+        edges = np.arange(0, max(self.gaps) + self.min_interval, self.min_interval)
+        if elapsed >= edges[-1]:
+            # Quieter than anything seen so far: the history says nothing here, stay fast
+            return self.min_interval
+        hist, _ = np.histogram(self.gaps, bins=edges)
+        pdf = hist / hist.sum()
+
+        # Cumulative poll count over time since the last hit, piecewise linear per bin
+        density = np.sqrt(pdf)
+        polls = self.polls_per_minute * edges[-1] / 60.0 * density / density.sum()
+        cumulative = np.concatenate(([0.0], np.cumsum(polls)))
+        current = np.interp(elapsed, edges, cumulative)
+        if current + 1 >= cumulative[-1]:
+            next_poll = edges[-1]
+        else:
+            # First crossing of current + 1; strictly above current, so flat (empty) bins are skipped
+            end = np.searchsorted(cumulative, current + 1)
+            start = end - 1
+            next_poll = edges[start] + (current + 1 - cumulative[start]) / polls[start] * self.min_interval
+
+        # Never skip a bin that holds hits: coming out of an empty stretch, poll by the start
+        # of the next such bin; inside a busy stretch, by the end of the next one
+        ahead = np.flatnonzero((pdf > 0) & (edges[:-1] > elapsed))
+        if len(ahead):
+            in_empty_bin = pdf[min(int(elapsed // self.min_interval), len(pdf) - 1)] == 0
+            next_poll = min(next_poll, edges[ahead[0]] if in_empty_bin else edges[ahead[0] + 1])
+        return float(np.clip(next_poll - elapsed, self.min_interval, self.max_interval))
@@ -0,0 +1,22 @@
+import numpy as np
+
+
+def letterbox_geometry(height, width, imgsz, square, stride=32):
+    # Scale and padding that fit a height x width frame into imgsz: the long side is scaled
+    # to imgsz, then padding is split evenly to reach a stride multiple (or an imgsz square)
+    scale = min(imgsz / height, imgsz / width)
+    new_height, new_width = round(height * scale), round(width * scale)
+    if square:
+        pad_h, pad_w = imgsz - new_height, imgsz - new_width
+    else:
+        pad_h, pad_w = -new_height % stride, -new_width % stride
+    top, left = pad_h // 2, pad_w // 2
+    return scale, (new_height, new_width), (top, pad_h - top, left, pad_w - left)
+
+
+def unletterbox_boxes(xyxy, scale, pad, frame_shape):
+    # Map [N, 4] xyxy boxes from letterboxed input back to integer pixels of the original frame
+    pad_x, pad_y = pad
+    frame_height, frame_width = frame_shape[:2]
+    boxes = (np.asarray(xyxy, dtype=np.float64).reshape(-1, 4) - [pad_x, pad_y, pad_x, pad_y]) / scale
+    return np.clip(boxes, 0, [frame_width, frame_height, frame_width, frame_height]).astype(np.int32)
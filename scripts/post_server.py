@@ -1,10 +1,19 @@
-from flask import Flask, request, jsonify
+import gzip
+import json
+import threading
+import uuid
+
+from flask import Flask, Response, request, jsonify
 
 app = Flask(__name__)
 
 # Create a global list in memory to store our detections
 # In a real application, use a database like SQLite, PostgreSQL, etc.
 detections_history = []
+# Wakes up stream subscribers whenever a detection is appended
+detections_cond = threading.Condition()
+# Changes on every restart so ETags from an earlier process never match the new history
+_BOOT_ID = uuid.uuid4().hex[:8]
 
 # Define a route to handle POST requests at the /api/detections endpoint
 @app.route('/api/detections', methods=['POST'])
@@ -13,11 +22,16 @@ def handle_detections():
         content_type = request.headers.get('Content-Type')
 
         if content_type == 'application/json':
-            data = request.get_json()
+            if request.headers.get('Content-Encoding') == 'gzip':
+                data = json.loads(gzip.decompress(request.get_data()))
+            else:
+                data = request.get_json()
             print("Received JSON data:", data)
             
             # 1. STORE THE DATA: Append the new detection to our history list
-            detections_history.append(data)
+            with detections_cond:
+                detections_history.append(data)
+                detections_cond.notify_all()
             print(f"Total detections stored: {len(detections_history)}")
             
             return jsonify({"status": "success", "message": "Data received"}), 200
@@ -34,19 +48,52 @@ def handle_detections():
 def get_detections():
     """This endpoint allows other machines to retrieve all stored detections."""
     try:
+        with detections_cond:
+            detections = list(detections_history)
         # Simply return the entire history list as JSON
-        return jsonify({
+        response = jsonify({
             "status": "success",
-            "count": len(detections_history),
-            "detections": detections_history
-        }), 200
+            "count": len(detections),
+            "detections": detections
+        })
+        # The history is append-only, so within one process its length identifies its content;
+        # pollers sending If-None-Match get an empty 304 until something new arrives
+        response.set_etag(f"{_BOOT_ID}-{len(detections)}")
+        return response.make_conditional(request)
     except Exception as e:
         return jsonify({"error": "Failed to retrieve data"}), 500
 
+# Push new detections over one long-lived connection instead of repeated GETs
+@app.route('/api/detections/stream', methods=['GET'])
+def stream_detections():
+    """Server-sent events stream; each event id is the detection's position in the history."""
+    last_event_id = request.headers.get('Last-Event-ID')
+    with detections_cond:
+        sent = len(detections_history)
+        if last_event_id and last_event_id.isdigit():
+            # An id from before a server restart can be past the (now shorter) history
+            sent = min(int(last_event_id), sent)
+
+    def event_stream(sent):
+        while True:
+            with detections_cond:
+                detections_cond.wait_for(lambda: len(detections_history) > sent, timeout=15)
+                new_detections = detections_history[sent:]
+            if not new_detections:
+                # Comment line keeps proxies from closing an idle connection
+                yield ": keep-alive\n\n"
+                continue
+            for data in new_detections:
+                sent += 1
+                yield f"id: {sent}\ndata: {json.dumps(data)}\n\n"
+
+    return Response(event_stream(sent), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 # 3. (Optional) Root endpoint for easy testing
 @app.route('/')
 def index():
-    return "Detection API is running. POST JSON to /api/detections or GET from it."
+    return "Detection API is running. POST JSON to /api/detections, GET from it, or subscribe to /api/detections/stream."
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=8080, debug=True)
\ No newline at end of file
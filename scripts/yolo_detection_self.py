@@ -1,23 +1,66 @@
 #!/usr/bin/env python3
 
 import cv2
+import gzip
 import json
+import numpy as np
+import orjson
+import random
+import re
+import shutil
+import signal
 import sys
 import os
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
 from ultralytics import YOLO
 import time
-from datetime import datetime
-import pytz
+from zoneinfo import ZoneInfo
 import yaml
 import requests
-import time
+import torch
+import torch.nn.functional as F
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from adaptive_poller import AdaptivePoller
+from letterbox import letterbox_geometry, unletterbox_boxes
+
+
+def create_http_session():
+    # Reuse keep-alive connections to the API instead of a new TCP handshake per POST
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=2,
+                          pool_maxsize=4,
+                          max_retries=Retry(total=3, backoff_factor=0.2))
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({'Content-Type': 'application/json'})
+    return session
+
+_POST_SESSION = create_http_session()
 
-def post_json_data(json_data, post_url, timeout=10):
+# Run inference on the first GPU in FP16 when one is available
+_DEVICE = 0 if torch.cuda.is_available() else "cpu"
+_HALF = torch.cuda.is_available()
+_IMGSZ = 640
+
+# Model types served by the stock COCO weights and filtered by the "classes" config
+_COCO_MODEL_TYPES = frozenset({"bicycle", "pets", "vehicle", "person"})
+
+def post_json_data(json_data, post_url, timeout=10, compress=False):
     try:
-        headers = {'Content-Type': 'application/json'}
-        response = requests.post(post_url, json=json_data, headers=headers, timeout=timeout)
+        body = orjson.dumps(json_data)
+        headers = None
+        if compress:
+            body = gzip.compress(body, compresslevel=6)
+            headers = {'Content-Encoding': 'gzip'}
+        response = _POST_SESSION.post(post_url, data=body, headers=headers, timeout=timeout)
         response.raise_for_status()
         print(f"Successfully posted JSON data to {post_url}")
         return True
@@ -26,27 +69,74 @@ def post_json_data(json_data, post_url, timeout=10):
         return False
 
 
-def detection(detector, frame, json_tmp, conf_threshold,class_list):
-    results = detector.predict(frame, conf=conf_threshold, verbose=True, classes=class_list)
-    detections,bbox_list = [], []
-    frame_height, frame_width = frame.shape[:2]
-    for result in results:
-        if hasattr(result, 'boxes') and result.boxes is not None:
-            boxes = result.boxes
-            for box in boxes:
-                # Get box coordinates
-                x1, y1, x2, y2 = map(int, box.xyxy[0].tolist())
-                if (x2 - x1) * (y2 - y1) / (frame_height * frame_width) < 0.9:
-                    detections.append({"x1": x1,
-                                       "y1": y1, 
-                                       "x2": x2,
-                                       "y2": y2,
-                                       "width": x2 - x1,
-                                       "height": y2 - y1
-                                       })
-                    bbox_list.append([x1,x2,y1,y2])    
-    json_tmp.update({ "bounding_box": detections })
-    return json_tmp,bbox_list
+# POSTs run off the detection loop; when the endpoint falls behind the oldest queued one is dropped
+_POST_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="post")
+_POST_QUEUE_LIMIT = 32
+_post_pending = []
+
+def _log_post_failure(future):
+    if not future.cancelled() and future.exception() is not None:
+        print(f"Unexpected error while posting JSON data: {future.exception()}")
+
+def submit_json_data(json_data, post_url, timeout=10, compress=False):
+    global _post_pending
+    _post_pending = [future for future in _post_pending if not future.done()]
+    if len(_post_pending) >= _POST_QUEUE_LIMIT:
+        for future in _post_pending:
+            if future.cancel():
+                _post_pending.remove(future)
+                print("POST queue full, dropped the oldest pending detection")
+                break
+    future = _POST_POOL.submit(post_json_data, json_data, post_url, timeout, compress)
+    future.add_done_callback(_log_post_failure)
+    _post_pending.append(future)
+    return future
+
+
+def frames_to_tensor(frames, square, stride=32):
+    # Letterbox on the GPU: BGR uint8 HWC frames -> RGB [0, 1] NCHW scaled to _IMGSZ,
+    # padded to a stride multiple (or to a full square for fixed-shape engines)
+    batch = torch.from_numpy(np.stack(frames)).pin_memory().to(torch.device("cuda", _DEVICE), non_blocking=True)
+    batch = batch.flip(-1).permute(0, 3, 1, 2)
+    batch = (batch.half() if _HALF else batch.float()) / 255
+    height, width = batch.shape[2:]
+    scale, new_size, (top, bottom, left, right) = letterbox_geometry(height, width, _IMGSZ, square, stride)
+    if new_size != (height, width):
+        batch = F.interpolate(batch, size=new_size, mode='bilinear', align_corners=False)
+    batch = F.pad(batch, (left, right, top, bottom), value=114 / 255)
+    return batch, scale, (left, top)
+
+
+def detection(detector, frames, json_tmps, conf_threshold,class_list):
+    if _HALF:
+        # Exported engines take a fixed square input; PyTorch weights accept any stride multiple
+        source, scale, pad = frames_to_tensor(frames, square=not isinstance(detector.model, torch.nn.Module))
+    else:
+        source, scale, pad = list(frames), 1.0, (0, 0)
+    # One predict call for the whole batch; results come back in frame order
+    results = detector.predict(source, conf=conf_threshold, verbose=True, classes=class_list,
+                               device=_DEVICE, half=_HALF, imgsz=_IMGSZ)
+    outputs = []
+    for frame, json_tmp, result in zip(frames, json_tmps, results):
+        detections,bbox_list = [], []
+        frame_height, frame_width = frame.shape[:2]
+        if hasattr(result, 'boxes') and result.boxes is not None and len(result.boxes):
+            # Filter all boxes at once instead of converting them one by one
+            xyxy = unletterbox_boxes(result.boxes.xyxy.cpu().numpy(), scale, pad, frame.shape)
+            widths = xyxy[:, 2] - xyxy[:, 0]
+            heights = xyxy[:, 3] - xyxy[:, 1]
+            kept = xyxy[widths * heights < 0.9 * frame_height * frame_width]
+            detections = [{"x1": x1,
+                           "y1": y1,
+                           "x2": x2,
+                           "y2": y2,
+                           "width": x2 - x1,
+                           "height": y2 - y1
+                           } for x1, y1, x2, y2 in kept.tolist()]
+            bbox_list = kept[:, [0, 2, 1, 3]].tolist()
+        json_tmp.update({ "bounding_box": detections })
+        outputs.append((json_tmp, bbox_list))
+    return outputs
 
 
 def load_model_config(config_path="./config.yaml"):
@@ -74,13 +164,22 @@ def get_config(config_type, key, config):
 
 def get_time(tz):
     now = datetime.now(tz)
-    day = now.strftime('%d')
-    month = now.strftime('%m')
-    year = now.strftime('%Y')
-    hour = now.strftime('%H')
+    day = f"{now.day:02d}"
+    month = f"{now.month:02d}"
+    year = f"{now.year:04d}"
+    hour = f"{now.hour:02d}"
     return day,month,year,hour
 
 
+@lru_cache(maxsize=1)
+def _format_second(second, tz):
+    return datetime.fromtimestamp(second, tz).replace(tzinfo=None).isoformat(sep=' ')
+
+def format_timestamp(tz):
+    # "%Y-%m-%d %H:%M:%S" in tz, rendered once per wall-clock second
+    return _format_second(int(time.time()), tz)
+
+
 def create_output_directories(tz):
     day, month, year, hour = get_time(tz)
     base_path="./output"
@@ -97,7 +196,31 @@ def create_output_directories(tz):
     
     return images_dir, output_path
 
+# Hardware H.264 decoders selectable through YOLO_DECODER; anything else uses FFmpeg on the CPU.
+# Needs an OpenCV built with GStreamer plus the matching decoder plugins. The opencv-python
+# wheel in requirements.txt has neither, so with the shipped image this always falls back.
+_GST_DECODERS = {
+    "nvdec": "nvh264dec ! videoconvert",
+    "vaapi": "vaapih264dec ! videoconvert",
+    "jetson": "nvv4l2decoder ! nvvidconv ! video/x-raw,format=BGRx ! videoconvert",
+}
+
+def gstreamer_pipeline(rtsp_url, decoder):
+    return (f"rtspsrc location={rtsp_url} latency=0 ! rtph264depay ! h264parse ! "
+            f"{_GST_DECODERS[decoder]} ! video/x-raw,format=BGR ! "
+            "appsink drop=true max-buffers=1 sync=false")
+
 def rtsp_stream_init(rtsp_url):
+    decoder = os.getenv('YOLO_DECODER', 'ffmpeg').lower()
+    if decoder in _GST_DECODERS:
+        if not re.search(r"GStreamer:\s*YES", cv2.getBuildInformation()):
+            print(f"OpenCV is built without GStreamer, ignoring YOLO_DECODER={decoder} and using FFmpeg")
+        else:
+            video_cap = cv2.VideoCapture(gstreamer_pipeline(rtsp_url, decoder), cv2.CAP_GSTREAMER)
+            if video_cap.isOpened():
+                return video_cap
+            print(f"GStreamer {decoder} decoding unavailable, falling back to FFmpeg")
+
     # Initialize RTSP stream with timeout settings
     video_cap = cv2.VideoCapture(rtsp_url, cv2.CAP_FFMPEG)
     
@@ -113,9 +236,36 @@ def rtsp_stream_init(rtsp_url):
     
     return video_cap
 
-def blur_face(image,frame_count):
-    face_detector = YOLO("./models/face_bounding.pt")
-    results = face_detector.predict(image, conf=0.5, verbose=True)
+def load_detector(model_path, batch=1):
+    # Optionally swap the .pt weights for a TensorRT FP16 engine, exported once and cached in
+    # YOLO_ENGINE_DIR (the models mount is read-only). Engines have a static batch size, so
+    # one is cached per batch size.
+    if _HALF and os.getenv('YOLO_TENSORRT', 'false').lower() == 'true':
+        engine_dir = Path(os.getenv('YOLO_ENGINE_DIR', './engines'))
+        engine_path = engine_dir / f"{Path(model_path).stem}.b{batch}.engine"
+        try:
+            if not engine_path.exists():
+                print(f"Exporting TensorRT engine for {model_path} (batch {batch})")
+                engine_dir.mkdir(parents=True, exist_ok=True)
+                # Export from a private copy, since Ultralytics writes next to its input and other
+                # services sharing the same weights may be exporting concurrently; the final
+                # rename within engine_dir is atomic
+                with tempfile.TemporaryDirectory(dir=engine_dir) as tmp_dir:
+                    weights = Path(tmp_dir) / Path(model_path).name
+                    shutil.copyfile(model_path, weights)
+                    exported = YOLO(str(weights)).export(format="engine", half=True, imgsz=_IMGSZ,
+                                                         batch=batch, device=_DEVICE)
+                    os.replace(exported, engine_path)
+            return YOLO(str(engine_path), task="detect")
+        except Exception as e:
+            print(f"TensorRT engine unavailable, using {model_path}: {e}")
+    detector = YOLO(model_path)
+    detector.fuse()
+    return detector
+
+def blur_face(face_detector, image, frame_count):
+    results = face_detector.predict(image, conf=0.5, verbose=True,
+                                    device=_DEVICE, half=_HALF, imgsz=_IMGSZ)
     for result in results:
         if hasattr(result, 'boxes') and result.boxes is not None:
             boxes = result.boxes
@@ -129,6 +279,14 @@ def blur_face(image,frame_count):
                 print(f"Blurred face at frame {frame_count}")
     return image
 
+def restore_box(canvas, source, bbox, pad=2):
+    # Undo a drawn rectangle by copying back only the pixels around that box
+    x1, x2, y1, y2 = bbox
+    height, width = canvas.shape[:2]
+    rows = slice(max(y1 - pad, 0), min(y2 + pad + 1, height))
+    cols = slice(max(x1 - pad, 0), min(x2 + pad + 1, width))
+    canvas[rows, cols] = source[rows, cols]
+
 def get_robot_pose():
     pose = {"x" : 0,
             "y" : 0,
@@ -139,6 +297,31 @@ def get_robot_pose():
     return pose
 
 
+# Set on SIGTERM (docker stop) so waits in the main loop return immediately
+_STOP = threading.Event()
+
+def request_stop(signum, frame):
+    print(f"\nReceived signal {signum}, stopping RTSP stream processing...")
+    _STOP.set()
+
+_RECONNECT_INITIAL_DELAY = 1.0
+_RECONNECT_MAX_DELAY = 60.0
+
+def reconnect_with_backoff(rtsp_url, delay):
+    # Retry quickly after short drops, backing off with jitter while the stream stays down.
+    # Returns the capture (None on shutdown) and the delay for the next failure, which the
+    # caller only resets once a frame has actually been read.
+    while not _STOP.wait(delay + random.random() * 0.25):
+        video_cap = rtsp_stream_init(rtsp_url)
+        delay = min(delay * 2, _RECONNECT_MAX_DELAY)
+        if video_cap.isOpened():
+            print(f"Reconnected to RTSP stream: {rtsp_url}")
+            return video_cap, delay
+        video_cap.release()
+        print(f"Failed to reconnect to RTSP stream, retrying in {delay:.0f}s")
+    return None, delay
+
+
 def main():
     # Load configuration
     config = load_model_config()
@@ -147,102 +330,125 @@ def main():
     api_config = config.get("api", {})
     post_endpoint = api_config.get("post_endpoint", "http://post-server:8080/api/detections")
     api_timeout = api_config.get("timeout", 10)
+    api_gzip = api_config.get("gzip", False)
     
     # Create output directories
-    hong_kong_tz = pytz.timezone('Asia/Hong_Kong')
+    hong_kong_tz = ZoneInfo('Asia/Hong_Kong')
     
     # Get configuration from environment variables
     model_type = os.getenv('YOLO_TYPE', 'person')
     stream_url = os.getenv('YOLO_STREAM', 'rtsp://18.167.218.143:10554/34020000001320118007_34020000001320118007')
     blur_enabled = os.getenv('YOLO_BLUR', 'true').lower() == 'true'
+    # Frames sampled over one detection period are sent to YOLO together
+    batch_size = max(1, int(os.getenv('YOLO_BATCH', '1')))
 
     video_cap = rtsp_stream_init(stream_url)
     print(f"Starting RTSP stream processing: {stream_url}")
 
     # Load model based on model_type from environment using config
     model_path = get_config("models", model_type, config)
-    detector = YOLO(model_path)
+    detector = load_detector(model_path, batch=batch_size)
+    # Loaded once up front instead of on every blurred frame
+    face_detector = load_detector("./models/face_bounding.pt") if blur_enabled else None
 
     robot = get_config("robot", stream_url, config)
     camera = get_config("camera", stream_url, config)
+    conf_threshold = get_config("confidence", model_type, config)
+    if model_type in _COCO_MODEL_TYPES:
+        class_list = get_config("classes", model_type, config)
+    else:
+        class_list=[0]
     
     frame_count = 0
     previous_detection = time.time()
-    detection_period = 3
+    poller = AdaptivePoller()
+    detection_period = poller.min_interval
     PEOPLE_CAP = 2
+    frame_batch = deque(maxlen=batch_size)
+    meta_batch = deque(maxlen=batch_size)
+
+    reconnect_delay = _RECONNECT_INITIAL_DELAY
 
+    signal.signal(signal.SIGTERM, request_stop)
     try:
-        while True:
-            success, frame = video_cap.read()
+        while not _STOP.is_set():
+            # grab() without retrieve() skips the colour conversion and copy of frames we don't sample
+            success = video_cap.grab()
+            sample_due = success and (time.time() - previous_detection) > detection_period / batch_size
+            if sample_due:
+                success, frame = video_cap.retrieve()
             if success:
                 frame_count += 1
-                if (time.time() - previous_detection) > detection_period:
-                    images_dir, output_dir = create_output_directories(hong_kong_tz)
+                reconnect_delay = _RECONNECT_INITIAL_DELAY
+                if sample_due:
                     detection_tmp = { "model_type": model_type,
-                                      "time": datetime.now(hong_kong_tz).strftime("%Y-%m-%d %H:%M:%S"),
+                                      "time": format_timestamp(hong_kong_tz),
                                       "robot": robot,
                                       "camera": camera,
                                       "pose":  get_robot_pose()}
-                    if model_type in ["bicycle",
-                                      "pets",
-                                      "vehicle",
-                                      "person"]:
-                        class_list = get_config("classes", model_type, config)
-                    else:
-                        class_list=[0]
+                    frame_batch.append(frame)
+                    meta_batch.append((frame_count, detection_tmp))
+                    previous_detection=time.time()
 
+                if len(frame_batch) == batch_size:
+                    images_dir, output_dir = create_output_directories(hong_kong_tz)
                     # Get detections as JSON array
                     print(f"Start detection of {model_type}: ")
-                    frame_detection, bbox_list = detection(detector, frame, detection_tmp, get_config("confidence", model_type, config), class_list)
-
-
-                    img_path_list=[]
-                    if blur_enabled and len(bbox_list)!=0:
-                        print(f"Start detection of faces: ")
-                        blurred_img = blur_face(frame,frame_count)
-                    for i, bbox in enumerate(bbox_list):
-                        img_filename = f"{robot}_{camera}_detection_{model_type}_{frame_count}_obj_{i}.jpg"
-                        img_filepath = images_dir / img_filename
-                        [x1, x2, y1, y2] = bbox
-                        bounded_image=blurred_img.copy()
-                        cv2.rectangle(bounded_image, (x1, y1), (x2, y2), (0, 255, 0), 2)       
-                        cv2.imwrite(str(img_filepath), bounded_image)
-                        img_path_list.append(str(output_dir / img_filename))
-
-                    if len(bbox_list)>PEOPLE_CAP:
-                        full_bounded_image=blurred_img.copy()
-                        img_filename = f"{robot}_{camera}_detection_{model_type}_{frame_count}_full_bound.jpg"
-                        img_filepath = images_dir / img_filename
-                        for bbox in bbox_list:
+                    batch_outputs = detection(detector, frame_batch, [tmp for _, tmp in meta_batch], conf_threshold, class_list)
+
+                    got_hit = False
+                    for frame, (frame_id, _), (frame_detection, bbox_list) in zip(frame_batch, meta_batch, batch_outputs):
+                        img_path_list=[]
+                        if len(bbox_list)!=0:
+                            blurred_img = frame
+                            if blur_enabled:
+                                print(f"Start detection of faces: ")
+                                blurred_img = blur_face(face_detector, frame, frame_id)
+                            # Single working copy: each box is drawn, saved, then erased again
+                            bounded_image=blurred_img.copy()
+                        for i, bbox in enumerate(bbox_list):
+                            img_filename = f"{robot}_{camera}_detection_{model_type}_{frame_id}_obj_{i}.jpg"
+                            img_filepath = images_dir / img_filename
                             [x1, x2, y1, y2] = bbox
-                            cv2.rectangle(full_bounded_image, (x1, y1), (x2, y2), (0, 255, 0), 2)     
-                        cv2.putText(full_bounded_image, f"PEOPLE COUNT: {len(bbox_list)}", (full_bounded_image.shape[1]-300, 30), 
-                                    cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
-                        cv2.imwrite(str(img_filepath), full_bounded_image)
-                        print("Exceed people count limit!!")
-                        img_path_list.append(str(output_dir / img_filename))
-                    
-                    # POST the JSON data
-                    if len(bbox_list)!=0:
-                        frame_detection.update({"image_path": img_path_list})
-                        print(f"JSON data: {frame_detection}")
-                        post_json_data(frame_detection, post_endpoint, api_timeout)
-                        detection_period=7
-                    else:
-                        detection_period=3
-
-                    print(f"Frame {frame_count}: {len(bbox_list)} detections saved")
-                    previous_detection=time.time()
+                            cv2.rectangle(bounded_image, (x1, y1), (x2, y2), (0, 255, 0), 2)       
+                            cv2.imwrite(str(img_filepath), bounded_image)
+                            restore_box(bounded_image, blurred_img, bbox)
+                            img_path_list.append(str(output_dir / img_filename))
+
+                        if len(bbox_list)>PEOPLE_CAP:
+                            full_bounded_image=bounded_image
+                            img_filename = f"{robot}_{camera}_detection_{model_type}_{frame_id}_full_bound.jpg"
+                            img_filepath = images_dir / img_filename
+                            for bbox in bbox_list:
+                                [x1, x2, y1, y2] = bbox
+                                cv2.rectangle(full_bounded_image, (x1, y1), (x2, y2), (0, 255, 0), 2)     
+                            cv2.putText(full_bounded_image, f"PEOPLE COUNT: {len(bbox_list)}", (full_bounded_image.shape[1]-300, 30), 
+                                        cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+                            cv2.imwrite(str(img_filepath), full_bounded_image)
+                            print("Exceed people count limit!!")
+                            img_path_list.append(str(output_dir / img_filename))
+                        
+                        # POST the JSON data
+                        if len(bbox_list)!=0:
+                            frame_detection.update({"image_path": img_path_list})
+                            print(f"JSON data: {frame_detection}")
+                            submit_json_data(frame_detection, post_endpoint, api_timeout, api_gzip)
+                            got_hit = True
+
+                        print(f"Frame {frame_id}: {len(bbox_list)} detections saved")
+
+                    detection_period = poller.next_interval(got_hit=got_hit)
+                    frame_batch.clear()
+                    meta_batch.clear()
 
             else:
                 print("Failed to read frame from RTSP stream")
                 # Try to reconnect with proper settings
                 video_cap.release()
-                time.sleep(100)
-                video_cap = rtsp_stream_init(stream_url)
-                if not video_cap.isOpened():
-                    print("Failed to reconnect to RTSP stream")
+                new_cap, reconnect_delay = reconnect_with_backoff(stream_url, reconnect_delay)
+                if new_cap is None:
                     break
+                video_cap = new_cap
                     
     except KeyboardInterrupt:
         print("\nStopping RTSP stream processing...")
@@ -250,6 +456,9 @@ def main():
         print(f"Total frames processed: {frame_count}")
         # Cleanup
         video_cap.release()
+        # Let queued alarms go out before closing the connection pool
+        _POST_POOL.shutdown(wait=True)
+        _POST_SESSION.close()
 
 if __name__=="__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,75 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts"))
+
+from adaptive_poller import AdaptivePoller
+
+
+def record_hits(poller, gaps):
+    # Each gap is a quiet stretch: one miss after the hit, then the next hit
+    now = 0.0
+    poller.next_interval(got_hit=True, now=now)
+    for gap in gaps:
+        poller.next_interval(got_hit=False, now=now + poller.hit_interval)
+        now += gap
+        poller.next_interval(got_hit=True, now=now)
+    return now
+
+
+def poll_schedule(poller, last_hit, first_wait, horizon):
+    # (time since last hit, wait returned at that poll) for idle polls up to horizon
+    elapsed, schedule = first_wait, []
+    while elapsed < horizon:
+        wait = poller.next_interval(got_hit=False, now=last_hit + elapsed)
+        schedule.append((elapsed, wait))
+        elapsed += wait
+    return schedule
+
+
+def test_fallback_without_history():
+    poller = AdaptivePoller()
+    assert poller.next_interval(got_hit=False, now=0.0) == poller.min_interval
+    assert poller.next_interval(got_hit=True, now=1.0) == poller.hit_interval
+    assert poller.next_interval(got_hit=False, now=9.0) == poller.min_interval
+
+
+def test_polls_land_in_the_bin_holding_all_hits():
+    poller = AdaptivePoller()
+    last_hit = record_hits(poller, [30.0] * 7)
+    polls = [t for t, _ in poll_schedule(poller, last_hit, poller.hit_interval, horizon=45.0)]
+    assert any(27.0 <= t <= 30.0 for t in polls)
+    # Nothing was ever seen before 27 s, so the empty stretch is covered with long waits
+    assert len([t for t in polls if t < 27.0]) <= 2
+
+
+def test_waits_stay_within_bounds():
+    poller = AdaptivePoller()
+    last_hit = record_hits(poller, [8.0, 40.0, 15.0, 22.0, 33.0, 11.0, 27.0, 19.0])
+    schedule = poll_schedule(poller, last_hit, poller.hit_interval, horizon=90.0)
+    assert all(poller.min_interval <= w <= poller.max_interval for _, w in schedule)
+
+
+def test_sustained_presence_does_not_slow_idle_polling():
+    poller = AdaptivePoller()
+    last_hit = record_hits(poller, [30.0] * 7)
+    # An object stays in view for five consecutive detections
+    for _ in range(5):
+        last_hit += 7.2
+        poller.next_interval(got_hit=True, now=last_hit)
+    assert list(poller.gaps) == [30.0] * 7
+
+    schedule = poll_schedule(poller, last_hit, poller.hit_interval, horizon=120.0)
+    # Past the observed 30 s support the poller falls back to the fast idle cadence
+    assert all(w == poller.min_interval for t, w in schedule if t >= 30.0)
+
+
+def test_sustained_presence_without_history_polls_fast():
+    poller = AdaptivePoller()
+    now = 0.0
+    for _ in range(5):
+        poller.next_interval(got_hit=True, now=now)
+        now += 7.2
+    assert len(poller.gaps) == 0
+    schedule = poll_schedule(poller, now - 7.2, 7.2, horizon=120.0)
+    assert all(w == poller.min_interval for _, w in schedule)
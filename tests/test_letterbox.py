@@ -0,0 +1,62 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts"))
+
+from letterbox import letterbox_geometry, unletterbox_boxes
+
+
+def letterbox_boxes(boxes, scale, pad):
+    # Forward mapping of frame-pixel boxes into the letterboxed input
+    pad_x, pad_y = pad
+    return np.asarray(boxes, dtype=np.float64) * scale + [pad_x, pad_y, pad_x, pad_y]
+
+
+def test_geometry_640x480_stride():
+    scale, new_size, padding = letterbox_geometry(480, 640, 640, square=False)
+    assert scale == 1.0
+    assert new_size == (480, 640)
+    assert padding == (0, 0, 0, 0)
+
+
+def test_geometry_640x480_square():
+    scale, new_size, padding = letterbox_geometry(480, 640, 640, square=True)
+    assert scale == 1.0
+    assert new_size == (480, 640)
+    assert padding == (80, 80, 0, 0)
+
+
+def test_geometry_1920x1080():
+    scale, new_size, padding = letterbox_geometry(1080, 1920, 640, square=False)
+    assert scale == 1 / 3
+    assert new_size == (360, 640)
+    assert padding == (12, 12, 0, 0)
+    _, _, padding = letterbox_geometry(1080, 1920, 640, square=True)
+    assert padding == (140, 140, 0, 0)
+
+
+def test_unletterbox_round_trips_known_boxes():
+    # Boxes as fractions of the frame, including ones touching the frame edges
+    boxes = np.array([[0.0, 0.0, 0.15, 0.1], [0.5, 0.5, 1.0, 1.0], [0.02, 0.07, 0.09, 0.16]])
+    for height, width, square in [(480, 640, False), (480, 640, True), (1080, 1920, False), (1080, 1920, True)]:
+        frame_boxes = np.round(boxes * [width, height, width, height]).astype(np.int32)
+        scale, _, (top, _, left, _) = letterbox_geometry(height, width, 640, square)
+        mapped = unletterbox_boxes(letterbox_boxes(frame_boxes, scale, (left, top)), scale, (left, top),
+                                   (height, width, 3))
+        assert mapped.dtype == np.int32
+        assert np.abs(mapped - frame_boxes).max() <= 1
+
+
+def test_unletterbox_640x480_square_offsets_and_clips():
+    scale, _, (top, _, left, _) = letterbox_geometry(480, 640, 640, square=True)
+    # A box touching the grey padding above and below the 640x480 frame
+    mapped = unletterbox_boxes([[10.0, 70.0, 200.0, 570.0]], scale, (left, top), (480, 640, 3))
+    assert mapped.tolist() == [[10, 0, 200, 480]]
+
+
+def test_unletterbox_1920x1080_scales_back():
+    scale, _, (top, _, left, _) = letterbox_geometry(1080, 1920, 640, square=False)
+    mapped = unletterbox_boxes([[100.0, 112.0, 200.0, 212.0]], scale, (left, top), (1080, 1920, 3))
+    assert mapped.tolist() == [[300, 300, 600, 600]]